@@ -4,6 +4,7 @@
 # 1. Satisfy the t-coverage property; and
 # 2. Minimize the number of blocks included in the final solution by using MIP.
 
+from math import comb
 from typing import Optional
 
 from ortools.linear_solver import pywraplp
@@ -14,7 +15,8 @@ from common import *
 _logger = create_logger('fuzzy_designs', logging.INFO)
 
 
-def find_min_fuzzy_design(t: int, v: int, k: int, lmb: int = 1) -> Optional[Solution]:
+def find_min_fuzzy_design(t: int, v: int, k: int, lmb: int = 1,
+                          threads: Optional[int] = None) -> Optional[Solution]:
     """
     Given the values t, v, k, and lambda, find a fuzzy design:
     1. Let V be the set of points, i.e. V = {0, ..., v-1}.
@@ -27,65 +29,81 @@ def find_min_fuzzy_design(t: int, v: int, k: int, lmb: int = 1) -> Optional[Solu
 
     sum_{c in C} d(c) = lmb.
 
-    If such a fuzzy design can be found, the function will be returned as a Dict, where
-    the keys of the Dict will be the blocks b with nonzero values d(b), and the values will be
-    the values of d(b).
+    If such a fuzzy design can be found, it is returned as a FuzzyDesign holding the blocks b
+    with nonzero values d(b) (as bitmasks) and the parallel values of d(b).
 
     Additionally, we want to minimize the number of blocks included in the design.
-    This necessitates a MIP instead of an LP, so we use CBC instead of GLOP, and we use multiple processors.
-    """
-    points = frozenset(range(v))
-    potential_blocks = frozenset(frozenset(b) for b in combinations(points, k))
-    tuples = frozenset(frozenset(p) for p in combinations(points, t))
+    This necessitates a MIP instead of an LP, so we use CBC instead of GLOP.
 
-    # Formulate the problem as an LP.
+    By default the solve is single-threaded: on the small instances this module targets, thread
+    startup costs more than it saves. Pass threads > 1 to parallelize; the setting is only
+    applied when the constraint matrix is large enough to plausibly benefit.
+    """
+    # Formulate the problem: the block variables and t-coverage constraints are built as a proto
+    # and loaded in one call; the integrality machinery is added on top below.
     solver = pywraplp.Solver.CreateSolver('CBC')
     if not solver:
         raise ValueError('Could not create solver.')
     # solver.EnableOutput()
 
-    # Create variables for all the blocks. These map
-    block_variables = {b: solver.NumVar(0, lmb, f'b_{b}') for b in potential_blocks}
-    _logger.info(f'Created {len(block_variables)} block variables.')
+    num_nonzeros = comb(v, t) * comb(v - t, k - t)
+    if threads is not None and threads > 1 and num_nonzeros >= THREAD_NNZ_THRESHOLD:
+        _logger.info(f'Solving with {threads} threads ({num_nonzeros} nonzeros).')
+        solver.SetNumThreads(threads)
+    else:
+        _logger.info(f'Solving single-threaded ({num_nonzeros} nonzeros).')
+
+    model, potential_blocks = coverage_model_proto(t, v, k, lmb, unit_objective=False)
+    errors = solver.LoadModelFromProto(model)
+    if errors:
+        raise ValueError(f'Could not load model: {errors}')
+    block_variables = dict(zip(potential_blocks, solver.variables()))
+    _logger.info(f'Created {len(block_variables)} block variables '
+                 f'and {solver.NumConstraints()} t-coverage constraints.')
 
     # Create the indicator variables (which are constrained to integer values) to determine if a block
     # is in the design or not.
     indicator_variables = {b: solver.IntVar(0, 1, f'x_{b}') for b in potential_blocks}
     _logger.info(f'Created {len(indicator_variables)} indicator variables.')
 
-    # Add a constraint for each set to cover.
-    num_tup_constraints = 0
-    for tup in tuples:
-        ct = solver.Constraint(lmb, lmb, f'c_{tup}')
-        for block, variable in block_variables.items():
-            ct.SetCoefficient(variable, 1 if tup.issubset(block) else 0)
-        num_tup_constraints += 1
-    _logger.info(f'Created {num_tup_constraints} t-coverage constraints.')
-
     # Now add constraints on the indicator variables.
     # If b > 0, then indicator variable x = 1.
     # If b = 0, then indicator variable x = 0.
     # The second will be forced by the objective function and this being a minimization problem.
+    # The linkage is b <= lmb * x (the earlier x >= b also capped b at 1, which was too tight
+    # for lmb > 1); the rows are built directly rather than through linear-expression objects.
     num_ind_constraints = 0
     for b in potential_blocks:
-        bb = block_variables[b]
-        xb = indicator_variables[b]
-        solver.Add(xb >= bb)
+        ct = solver.Constraint(0, solver.infinity(), f'l_{b}')
+        ct.SetCoefficient(indicator_variables[b], lmb)
+        ct.SetCoefficient(block_variables[b], -1)
         num_ind_constraints += 1
     _logger.info(f'Created {num_ind_constraints} block indicator constraints')
 
     # Formulate objective function to pick the minimum number of blocks possible to solve the problem,
     # regardless of what uniform coefficients each block has.
     objective = solver.Objective()
+    # Bind the setter once rather than re-resolving the attribute per indicator.
+    set_coefficient = objective.SetCoefficient
     for x in indicator_variables.values():
-        objective.SetCoefficient(x, 1)
+        set_coefficient(x, 1)
     objective.SetMinimization()
+
+    # The uniform fuzzy design d(b) = lmb / C(v-t, k-t) over all blocks is always feasible,
+    # so offer it as a starting hint to the solver.
+    uniform = lmb / comb(v - t, k - t)
+    solver.SetHint(list(block_variables.values()) + list(indicator_variables.values()),
+                   [uniform] * len(block_variables) + [1] * len(indicator_variables))
+
     solver.Solve()
     obj_value = Fraction(objective.Value()).limit_denominator()
 
-    return obj_value, {b: s
-                       for b, v in block_variables.items()
-                       if (s := Fraction(v.solution_value()).limit_denominator())}
+    # Extract all values in one batch call and keep only the support; the block variables occupy
+    # the first C(v, k) slots, so the trailing indicator values are sliced away.
+    values = np.array(solution_values(solver)[:len(potential_blocks)])
+    support = np.flatnonzero(values)
+    block_masks = np.array(subset_masks(v, k), dtype=np.uint64)
+    return obj_value, FuzzyDesign(block_masks[support], values[support])
 
 
 if __name__ == '__main__':
@@ -13,7 +13,7 @@ from common import *
 _logger = create_logger('fuzzy_designs', logging.INFO)
 
 
-def find_csp_fuzzy_design(t: int, v: int, k: int, lmb: int = 1) -> Optional[Solution]:
+def find_csp_fuzzy_design(t: int, v: int, k: int, lmb: int = 1, closed_form: bool = True) -> Optional[Solution]:
     """
     Given the values t, v, k, and lambda, find a fuzzy design:
     1. Let V be the set of points, i.e. V = {0, ..., v-1}.
@@ -26,39 +26,39 @@ def find_csp_fuzzy_design(t: int, v: int, k: int, lmb: int = 1) -> Optional[Solu
 
     sum_{c in C} d(c) = lmb.
 
-    If such a fuzzy design can be found, the function will be returned as a Dict, where
-    the keys of the Dict will be the blocks b with nonzero values d(b), and the values will be
-    the values of d(b).
+    If such a fuzzy design can be found, it is returned as a FuzzyDesign holding the blocks b
+    with nonzero values d(b) (as bitmasks) and the parallel values of d(b).
 
     This simply amounts of solving an LP, so we use GLOP.
-    """
-    points = frozenset(range(v))
-    potential_blocks = frozenset(frozenset(b) for b in combinations(points, k))
-    tuples = frozenset(frozenset(p) for p in combinations(points, t))
 
-    # Formulate the problem as an LP.
+    The formulation is Sym(v)-invariant: every t-subset lies in exactly C(v-t, k-t) blocks, so
+    assigning d(b) = lmb / C(v-t, k-t) to every block covers each tuple exactly lmb times, and
+    summing the coverage over all tuples shows that any feasible solution has the same total
+    weight lmb * C(v, t) / C(k, t). The uniform assignment is thus always optimal, and by default
+    we return it in closed form without invoking the solver; pass closed_form=False to run GLOP.
+    """
+    if closed_form:
+        solution_size = Fraction(lmb * comb(v, t), comb(k, t))
+        d = Fraction(lmb, comb(v - t, k - t))
+        _logger.info(f'Closed-form solution of size {solution_size}: {d} per block.')
+        block_masks = np.array(subset_masks(v, k), dtype=np.uint64)
+        return solution_size, FuzzyDesign(block_masks, np.full(len(block_masks), float(d)))
+
+    # Formulate the problem as an LP: the whole model (variables, constraints, and the
+    # minimize-total-weight objective) is built as a proto and loaded in one call.
     solver = pywraplp.Solver.CreateSolver('GLOP')
     if not solver:
         raise ValueError('Could not create solver.')
 
-    # Create variables for all the blocks.
-    block_variables = {b: solver.NumVar(0, lmb, str(b)) for b in potential_blocks}
-    _logger.info(f'Created {len(block_variables)} variables.')
-
-    # Add a constraint for each set to cover.
-    constraints = []
-    for tup in tuples:
-        ct = solver.Constraint(lmb, lmb, str(tup))
-        for block, variable in block_variables.items():
-            ct.SetCoefficient(variable, 1 if tup.issubset(block) else 0)
-        constraints.append(ct)
-    _logger.info(f'Created {len(constraints)} constraints.')
+    model, potential_blocks = coverage_model_proto(t, v, k, lmb)
+    errors = solver.LoadModelFromProto(model)
+    if errors:
+        raise ValueError(f'Could not load model: {errors}')
+    _logger.info(f'Created {solver.NumVariables()} variables and {solver.NumConstraints()} constraints.')
 
-    # Formulate objective function to pick the minimum number of blocks.
+    # The objective picks the minimum total weight over the blocks.
     # Note that this just guarantees satisfiability, and does not impose issue values on the blocks.
     objective = solver.Objective()
-    for variable in block_variables.values():
-        objective.SetCoefficient(variable, 1)
     objective.SetMinimization()
 
     # Calculate the required solution size.
@@ -72,9 +72,11 @@ def find_csp_fuzzy_design(t: int, v: int, k: int, lmb: int = 1) -> Optional[Solu
         _logger.warning(f'Solution of size {obj_value} found, expected: {solution_size}')
         return None
 
-    return solution_size, {b: s
-                           for b, v in block_variables.items()
-                           if (s := Fraction(v.solution_value()).limit_denominator())}
+    # Extract all values in one batch call and keep only the support.
+    values = np.array(solution_values(solver))
+    support = np.flatnonzero(values)
+    block_masks = np.array(subset_masks(v, k), dtype=np.uint64)
+    return solution_size, FuzzyDesign(block_masks[support], values[support])
 
 
 if __name__ == '__main__':
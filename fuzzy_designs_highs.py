@@ -0,0 +1,68 @@
+# fuzzy_designs_highs.py
+# By Sebastian Raaphorst, 2023.
+#
+# Simply satisfy the t-set coverage property, using SciPy's HiGHS interface instead of OR-Tools.
+
+from math import comb
+from typing import Optional
+
+import numpy as np
+from scipy.optimize import linprog
+from scipy.sparse import csr_matrix
+
+from common import *
+
+_logger = create_logger('fuzzy_designs', logging.INFO)
+
+
+def find_csp_fuzzy_design_highs(t: int, v: int, k: int, lmb: int = 1) -> Optional[Solution]:
+    """
+    Given the values t, v, k, and lambda, find a fuzzy design:
+    1. Let V be the set of points, i.e. V = {0, ..., v-1}.
+    2. Let B be the possible block set, i.e. B = V choose k (all k-subsets of V).
+    3. Let T be the set to cover, i.e. T = V choose t (all t-subsets of V).
+
+    If a fuzzy design exists, it is essentially a function d: B -> [0,lmb].
+    The fuzzy design will satisfy the properties:
+    For every S in T, the subset of C of B containing S will have:
+
+    sum_{c in C} d(c) = lmb.
+
+    If such a fuzzy design can be found, it is returned as a FuzzyDesign holding the blocks b
+    with nonzero values d(b) (as bitmasks) and the parallel values of d(b).
+
+    This is the same LP as in find_csp_fuzzy_design, but solved with HiGHS via
+    scipy.optimize.linprog: the equality constraints are handed over as one CSR sparse matrix
+    built from the incidence bitmasks, so there is no per-coefficient FFI traffic at all.
+    """
+    block_masks = np.array(subset_masks(v, k), dtype=np.uint64)
+    tuple_masks = np.array(subset_masks(v, t), dtype=np.uint64)
+    incidence = build_incidence(tuple_masks, block_masks)
+    rows, cols = np.nonzero(incidence)
+    a_eq = csr_matrix((np.ones(len(rows)), (rows, cols)), shape=incidence.shape)
+    _logger.info(f'Built {a_eq.shape[0]} constraints over {a_eq.shape[1]} variables '
+                 f'({a_eq.nnz} nonzeros).')
+
+    result = linprog(c=np.ones(len(block_masks)),
+                     A_eq=a_eq,
+                     b_eq=np.full(len(tuple_masks), lmb),
+                     bounds=(0, lmb),
+                     method='highs-ds')
+    if not result.success:
+        _logger.warning(f'HiGHS could not solve the LP: {result.message}')
+        return None
+
+    # Check the objective against the required solution size.
+    solution_size = Fraction(lmb * comb(v, t), comb(k, t))
+    obj_value = Fraction(result.fun).limit_denominator()
+    if obj_value != solution_size:
+        _logger.warning(f'Solution of size {obj_value} found, expected: {solution_size}')
+        return None
+
+    # Keep only the support of the solution vector.
+    support = np.flatnonzero(result.x)
+    return solution_size, FuzzyDesign(block_masks[support], result.x[support])
+
+
+if __name__ == '__main__':
+    main(find_csp_fuzzy_design_highs)